@@ -20,7 +20,12 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import gettext
 _ = gettext.gettext
-from math import sqrt, sin, cos, tan, radians, atan2, pi
+from math import sqrt, hypot, sin, cos, tan, radians, degrees, atan2, pi, isinf
+from array import array
+from collections import namedtuple
+import os
+import struct
+import sys
 
 import inkex
 import simpletransform
@@ -32,6 +37,11 @@ version = '0.9.0 alpha 1'
 version_info = (0, 9, 0, 'alpha', 1)
 hexversion = 0x000900a1
 
+# Header of the binary bounding box file format. See write_boxes().
+_BOXFILE_MAGIC = b'PYBOUNDS'
+_BOXFILE_VERSION = 1
+_BOXFILE_HEADER = struct.Struct('<8sIIQQ')
+
 class BoundingBox:
     """A class which represents a bounding box. It has four attributes
     (left, right, bottom and top) which define the edges of the box, and
@@ -137,6 +147,215 @@ class BoundingBox:
         self.bottom = min(self.bottom, y)
         self.top = max(self.top, y)
 
+class OrientedBoundingBox:
+    """A class which represents a bounding box which is not necessarily aligned
+    with the axes of the image. The box is stored as a
+    :class:`bounds.BoundingBox` in a coordinate system which has been rotated
+    from that of the image.
+
+    """
+
+    def __init__(self, box, angle):
+        """
+        :param box: A :class:`bounds.BoundingBox` giving the edges of the box
+                    in the rotated coordinate system.
+        :param angle: The angle, in degrees, that the x-axis of the rotated
+                      coordinate system makes with the x-axis of the image.
+
+        A point ``(x,y)`` in the image is at
+        ``(x*cos(angle) + y*sin(angle), y*cos(angle) - x*sin(angle))`` in the
+        rotated coordinate system.
+
+        """
+        self.box = box
+        self.angle = angle
+
+    def width(self):
+        """The length of the edges of the box parallel to the rotated x-axis.
+
+        :return: The width of the box.
+
+        """
+        return self.box.right - self.box.left
+
+    def height(self):
+        """The length of the edges of the box parallel to the rotated y-axis.
+
+        :return: The height of the box.
+
+        """
+        return self.box.top - self.box.bottom
+
+    def area(self):
+        """The area enclosed by the box.
+
+        :return: The area of the box.
+
+        """
+        return self.width() * self.height()
+
+    def corners(self):
+        """Get the corners of the box in the coordinate system of the image.
+
+        :return: A list of four points, each a pair of numbers (x,y). The
+                 corners are given in the order bottom-left, bottom-right,
+                 top-right and top-left in the rotated coordinate system.
+
+        """
+        c = cos(radians(self.angle))
+        s = sin(radians(self.angle))
+        b = self.box
+        return [(x*c - y*s, x*s + y*c) for x, y in ((b.left, b.bottom),
+                                                    (b.right, b.bottom),
+                                                    (b.right, b.top),
+                                                    (b.left, b.top))]
+
+class ImmutableBoundingBox(namedtuple('ImmutableBoundingBox',
+                                      'left right bottom top')):
+    """An immutable version of :class:`bounds.BoundingBox`. It has the same
+    four attributes (left, right, bottom and top), but they cannot be changed;
+    methods which would modify a :class:`bounds.BoundingBox` return a new box
+    instead. As it is a tuple, it can be shared freely between threads and
+    used as a dictionary key.
+
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, x0, x1, y0, y1):
+        """
+        :param x0: The x-value representing one vertical edge of the box.
+        :param x1: The x-value representing the other vertical edge.
+        :param y0: The y-value representing one horizontal edge of the box.
+        :param y1: The y-value representing the other horizontal edge.
+
+        As with :class:`bounds.BoundingBox`, the lower x-value is used for the
+        left edge and the lower y-value for the bottom.
+
+        """
+        return super(ImmutableBoundingBox, cls).__new__(cls, min(x0, x1),
+                                                        max(x0, x1),
+                                                        min(y0, y1),
+                                                        max(y0, y1))
+
+    def contains(self, point):
+        """Check if the given point is contained with this box.
+
+        :param point: The point to check specified as a pair of numbers (x,y).
+        :return: True or False.
+
+        """
+        return self.contains_x(point[0]) and self.contains_y(point[1])
+
+    def contains_x(self, x):
+        """Check if the given x value is within the range of x values
+        encompassed by the box.
+
+        :param x: The x value to check.
+        :return: True or False
+
+        """
+        return not (x < self.left or x > self.right)
+
+    def contains_y(self, y):
+        """Check if the given y value is within the range of y values
+        encompassed by the box.
+
+        :param y: The y value to check.
+        :return: True or False
+
+        """
+        return not (y < self.bottom or y > self.top)
+
+    def combined(self, box):
+        """Get a box encompassing both this box and another bounding box.
+
+        :param box: The other box.
+        :return: A new :class:`bounds.ImmutableBoundingBox`.
+
+        """
+        return ImmutableBoundingBox(min(self.left, box.left),
+                                    max(self.right, box.right),
+                                    min(self.bottom, box.bottom),
+                                    max(self.top, box.top))
+
+    def extended(self, point):
+        """Get a box encompassing both this box and the given point.
+
+        :param point: The point specified as a pair of numbers (x,y).
+        :return: A new :class:`bounds.ImmutableBoundingBox`.
+
+        """
+        return ImmutableBoundingBox(min(self.left, point[0]),
+                                    max(self.right, point[0]),
+                                    min(self.bottom, point[1]),
+                                    max(self.top, point[1]))
+
+    def mutable(self):
+        """Get a mutable copy of this box.
+
+        :return: A new :class:`bounds.BoundingBox`.
+
+        """
+        return BoundingBox(self.left, self.right, self.bottom, self.top)
+
+def _quadratic_extremum(q0, q1, q2):
+    """Find the parameter at which a one-dimensional quadratic Bézier curve
+    has an extremum.
+
+    :return: The parameter t in (0, 1), or ``None`` if there is no extremum
+             within the curve.
+
+    """
+    d0 = q1 - q0
+    d1 = q2 - q1
+
+    # If the control point is midway between the ends, the curve is a straight
+    # line with no extremum.
+    if d0 == d1:
+        return None
+    t = d0 / (d0 - d1)
+    if t > 0.0 and t < 1.0:
+        return t
+    return None
+
+def _cubic_extrema(q0, q1, q2, q3):
+    """Find the parameters at which a one-dimensional cubic Bézier curve has
+    extrema.
+
+    :return: A list of the parameters t in (0, 1) of the extrema.
+
+    """
+
+    # Values for the quadratic formula giving the roots of the derivative.
+    # Note a is actually 2a - it is always used as 2a or 4a so this reduces
+    # the number of computations.
+    a = 6*(q1-q0) - 12*(q2-q1) + 6*(q3-q2)
+    b = -6*(q1-q0) + 6*(q2-q1)
+    c = 3*(q1-q0)
+
+    # Check the discriminant - solutions must be real
+    discriminant = b**2 - (2*a*c)
+    if discriminant < 0:
+        return []
+
+    # The usual form of the quadratic formula suffers from cancellation when a
+    # is small, and divides by zero when it is zero (i.e., the derivative is
+    # linear). Instead, use the form which finds one root from q and the other
+    # from c/q. If a is zero only the second root exists, and if q is zero (b
+    # and c are zero too) the only root is zero.
+    if b < 0:
+        q = (-b + sqrt(discriminant)) / 2.0
+    else:
+        q = (-b - sqrt(discriminant)) / 2.0
+    roots = []
+    if a != 0:
+        roots.append(2*q / a)
+    if q != 0:
+        roots.append(c / q)
+
+    return [t for t in roots if t > 0.0 and t < 1.0]
+
 def quadratic_bounding_box(p0, p1, p2, box=None):
     """Calculate the bounding box of a quadratic Bézier curve.
 
@@ -174,21 +393,15 @@ def quadratic_bounding_box(p0, p1, p2, box=None):
 
     # If not already encompassed, find the extrema in the x direction
     if not contains_x:
-        q0 = p1[0] - p0[0]
-        q1 = p2[0] - p1[0]
-        t = q0 / (q0 - q1)
-
-        if t > 0.0 and t < 1.0:
+        t = _quadratic_extremum(p0[0], p1[0], p2[0])
+        if t is not None:
             x = p0[0]*(1 - t)**2 + p1[0]*2*(1-t)*t + p2[0]*t**2
             box.extend_x(x)
 
     # If not already encompassed, find the extrema in the y direction
     if not contains_y:
-        q0 = p1[1] - p0[1]
-        q1 = p2[1] - p1[1]
-        t = q0 / (q0 - q1)
-
-        if t > 0.0 and t < 1.0:
+        t = _quadratic_extremum(p0[1], p1[1], p2[1])
+        if t is not None:
             y = p0[1]*(1 - t)**2 + p1[1]*2*(1-t)*t + p2[1]*t**2
             box.extend_y(y)
 
@@ -234,42 +447,8 @@ def cubic_bounding_box(p0, p1, p2, p3, box=None):
     # Helper function to calculate the extrema values for the given points.
     # Used since identical logic is required to calculate both x and y extrema.
     def extrema_values(p0, p1, p2, p3):
-        # Values for the quadratic formula
-        # Note a is actually 2a - it is always used as 2a or 4a so this reduces
-        # the number of computations.
-        a = 6*(p1-p0) - 12*(p2-p1) + 6*(p3-p2)
-        b = -6*(p1-p0) + 6*(p2-p1)
-        c = 3*(p1-p0)
-
-        # Check the discriminant - solutions must be real
-        discriminant = b**2 - (2*a*c)
-        if discriminant < 0:
-            return []
-
-        # Lambda function to calculate value from location
         bezier = lambda t: p0*(1-t)**3 + 3*p1*t*(1-t)**2 + 3*p2*(1-t)*t**2 + p3*t**3
-
-        # Value of -b/2a is used repeatedly
-        ba = -b / a
-
-        # Single (repeated) real value
-        if discriminant == 0:
-            t = ba
-            if t > 0.0 and t < 1.0:
-                return [bezier(t)]
-            else:
-                return []
-
-        # Pair of values
-        vals = []
-        discriminant = sqrt(discriminant) / a
-        t = ba + discriminant
-        if t > 0.0 and t < 1.0:
-            vals.append(bezier(t))
-        t = ba - discriminant
-        if t > 0.0 and t < 1.0:
-            vals.append(bezier(t))
-        return vals
+        return [bezier(t) for t in _cubic_extrema(p0, p1, p2, p3)]
 
     # Calculate the extent of the curve in the x-direction
     if not contains_x:
@@ -286,6 +465,133 @@ def cubic_bounding_box(p0, p1, p2, p3, box=None):
     # And done
     return box
 
+def _arc_centre_parameters(start, rx, ry, rotation, large_arc, sweep, end):
+    """Convert an SVG elliptical arc to its centre parameterisation.
+
+    :param start: The start point of the arc.
+    :param rx: The semi-major (x) radius of the arc.
+    :param ry: The semi-minor (y) radius of the arc.
+    :param rotation: The rotation of the x-axis of the arc in degrees.
+    :param large_arc: If the angle swept by the arc is greater than 180 degrees.
+    :param sweep: Which direction the arc is swept in.
+    :param end: The end point of the arc.
+    :return: A tuple ``(cx, cy, rx, ry, theta1, dtheta)``, or ``None`` if the
+             start and end points are too close together to be told apart.
+
+    The returned tuple contains the centre of the ellipse, its (possibly
+    scaled) radii, the angle of the start point and the signed angle swept by
+    the arc. Both angles are in radians. The start and end points must differ
+    and neither radius may be zero. If they differ by so little that the
+    distance between them relative to the radii underflows to zero, the arc is
+    treated as if the points were the same and ``None`` is returned. If they
+    are close enough that the small arc between them is too short to measure,
+    its swept angle is zero.
+
+    """
+
+    # Make sure the radii are positive.
+    if rx < 0:
+        rx = -rx
+    if ry < 0:
+        ry = -ry
+
+    # Ensure the flags to boolean values. As per the SVG 1.1 specification,
+    # non-zero values for large_arc or sweep are treated as true.
+    if large_arc != 0:
+        large_arc = True
+    if sweep != 0:
+        sweep = True
+
+    # Convert rotation angle to radians as this is what the Python
+    # trigonometric functions work with. Also pre-compute the sine and cosine
+    # of the angle.
+    rotation = radians(rotation)
+    sin_rotation = sin(rotation)
+    cos_rotation = cos(rotation)
+
+    # Unpack the start and end points.
+    x1, y1 = start
+    x2, y2 = end
+
+    # Transform the origin to the midpoint of the line joining the start and
+    # end points.
+    xm =  (cos_rotation * (x1 - x2)/2.0) + (sin_rotation * (y1 - y2)/2.0)
+    ym = -(sin_rotation * (x1 - x2)/2.0) + (cos_rotation * (y1 - y2)/2.0)
+
+    # Check the radii are large enough to join the start and end. If they are
+    # not, there are no solutions for the centre point, and per the SVG 1.1
+    # specification we increase the radii to obtain a solution. The scale is
+    # calculated with hypot() so that tiny radii do not overflow its
+    # intermediate squares. For subnormal radii the scale itself can overflow,
+    # so the scaled radii are calculated from the ratio of the radii instead.
+    s = hypot(xm/rx, ym/ry)
+
+    # If the endpoints are so close together that the scale underflows, they
+    # cannot be told apart and there is no arc.
+    if s == 0:
+        return None
+
+    if s > 1.0:
+        if isinf(s):
+            rx, ry = hypot(xm, ym*(rx/ry)), hypot(xm*(ry/rx), ym)
+        else:
+            rx = rx * s
+            ry = ry * s
+        root = 0.0
+
+    # Radii were large enough. The coefficient is written in terms of the
+    # scale alone, as sqrt(1/s**2 - 1), so nothing underflows for tiny radii.
+    # The factor under the root can be slightly negative due to rounding when
+    # the radii are only just large enough.
+    else:
+        root = sqrt(max((1.0 - s)*(1.0 + s), 0.0))
+        if large_arc == sweep:
+            root = -root
+
+    # Calculate the transformed centre. The division by the scale is applied
+    # to the midpoint first; the results are no larger than the radii, so
+    # they cannot overflow when the endpoints are very close together.
+    cxprime =  root * (ym/s) * (rx/ry)
+    cyprime = -root * (xm/s) * (ry/rx)
+
+    # Calculate the centre
+    cx = (cos_rotation * cxprime) - (sin_rotation * cyprime) + (x1 + x2)/2.0
+    cy = (sin_rotation * cxprime) + (cos_rotation * cyprime) + (y1 + y2)/2.0
+
+    # Function to calculate the angle between two vectors mod 360 degrees.
+    def angle_between_vectors(a, b):
+        atana = atan2(a[1], a[0])
+        atanb = atan2(b[1], b[0])
+        if atanb >= atana:
+            return atanb - atana;
+        return (2 * pi) - (atana - atanb);
+
+    # Calculate the start angle and angle the arc sweeps through
+    theta1 = angle_between_vectors((1.0, 0.0), ((xm - cxprime)/rx, (ym - cyprime)/ry))
+    dtheta = angle_between_vectors(((xm - cxprime)/rx,  (ym - cyprime)/ry),
+                                  ((-xm - cxprime)/rx, (-ym - cyprime)/ry))
+
+    # Make sure the sweep angle is in the correct range based upon the sweep
+    # flag.
+    if not sweep and dtheta > 0:
+        dtheta = dtheta - (2.0 * pi);
+    elif sweep and dtheta < 0:
+        dtheta = dtheta + (2.0 * pi);
+
+    # When the endpoints are very close together compared to the radii, the
+    # angles of the two endpoints can round to the same value. The arc then
+    # appears to sweep through either nothing or a whole turn, whichever the
+    # flags were meant to select, so use the large arc flag to decide.
+    if large_arc and abs(dtheta) < pi/2:
+        if sweep:
+            dtheta = 2.0 * pi
+        else:
+            dtheta = -2.0 * pi
+    elif not large_arc and abs(dtheta) > 3*pi/2:
+        dtheta = 0.0
+
+    return cx, cy, rx, ry, theta1, dtheta
+
 def elliptical_arc_bounding_box(start, rx, ry, rotation, large_arc, sweep, end,
                                 box=None):
     """Compute the bounding box for an SVG elliptical arc.
@@ -355,90 +661,23 @@ def elliptical_arc_bounding_box(start, rx, ry, rotation, large_arc, sweep, end,
     if rx == 0 or ry == 0:
         return box
 
-    # Make sure the radii are positive.
-    if rx < 0:
-        rx = -rx
-    if ry < 0:
-        ry = -ry
-
-    # Ensure the flags to boolean values. As per the SVG 1.1 specification,
-    # non-zero values for large_arc or sweep are treated as true.
-    if large_arc != 0:
-        large_arc = True
-    if sweep != 0:
-        sweep = True
+    # Convert the arc to its centre parameterisation. If the endpoints are
+    # too close together to find the centre, only they are included.
+    params = _arc_centre_parameters(start, rx, ry, rotation, large_arc, sweep,
+                                    end)
+    if params is None:
+        return box
+    cx, cy, rx, ry, theta1, dtheta = params
+    if dtheta == 0:
+        return box
 
-    # Convert rotation angle to radians as this is what the Python
-    # trigonometric functions work with. Also pre-compute the sine and cosine
-    # of the angle.
+    # Ensure the sweep flag is a boolean value, and pre-compute the sine and
+    # cosine of the rotation angle.
+    sweep = (sweep != 0)
     rotation = radians(rotation)
     sin_rotation = sin(rotation)
     cos_rotation = cos(rotation)
 
-    # Unpack the start and end points.
-    x1, y1 = start
-    x2, y2 = end
-
-    # Transform the origin to the midpoint of the line joining the start and
-    # end points.
-    xm =  (cos_rotation * (x1 - x2)/2.0) + (sin_rotation * (y1 - y2)/2.0)
-    ym = -(sin_rotation * (x1 - x2)/2.0) + (cos_rotation * (y1 - y2)/2.0)
-
-    # Pre-square some values.
-    rx2 = rx**2
-    ry2 = ry**2
-    xm2 = xm**2
-    ym2 = ym**2
-
-    # Numerator of the root used to calculated the transformed centre.
-    numerator = rx2*ry2 - rx2*ym2 - ry2*xm2
-
-    # If the numerator is negative, there are no solutions for the centre point
-    # (i.e., the radii are not large enough to join the start and end). Per the
-    # SVG 1.1 specification, we increase the radii to obtain a solution.
-    if numerator < 0.0:
-        s = sqrt(1.0 - numerator/(rx2*ry2))
-        rx = rx * s
-        ry = ry * s
-        rx2 = rx**2
-        ry2 = ry**2
-        root = 0.0
-
-    # Radii were large enough
-    else:
-        if large_arc == sweep:
-            root = -1 * sqrt(numerator/(rx2*ym2 + ry2*xm2))
-        else:
-            root = sqrt(numerator/(rx2*ym2 + ry2*xm2))
-
-    # Calculate the transformed centre
-    cxprime =  (root * rx * ym)/ry
-    cyprime = -(root * ry * xm)/rx
-
-    # Calculate the centre
-    cx = (cos_rotation * cxprime) - (sin_rotation * cyprime) + (x1 + x2)/2.0
-    cy = (sin_rotation * cxprime) + (cos_rotation * cyprime) + (y1 + y2)/2.0
-
-    # Function to calculate the angle between two vectors mod 360 degrees.
-    def angle_between_vectors(a, b):
-        atana = atan2(a[1], a[0])
-        atanb = atan2(b[1], b[0])
-        if atanb >= atana:
-            return atanb - atana;
-        return (2 * pi) - (atana - atanb);
-
-    # Calculate the start angle and angle the arc sweeps through
-    theta1 = angle_between_vectors((1.0, 0.0), ((xm - cxprime)/rx, (ym - cyprime)/ry))
-    dtheta = angle_between_vectors(((xm - cxprime)/rx,  (ym - cyprime)/ry),
-                                  ((-xm - cxprime)/rx, (-ym - cyprime)/ry))
-
-    # Make sure the sweep angle is in the correct range based upon the sweep
-    # flag.
-    if not sweep and dtheta > 0:
-        dtheta = dtheta - (2.0 * pi);
-    elif sweep and dtheta < 0:
-        dtheta = dtheta + (2.0 * pi);
-
     # Convert to start and end angles in the range [-pi, pi] as this is the
     # region atan2 will return extrema locations in.
     if theta1 > pi:
@@ -511,84 +750,31 @@ def path_bounding_box(path, box=None):
 
     This function splits the path into its segments, calculates the bounding
     box for each segment and combines them to get the bounding box of the path.
+    All subpaths are included, including those following a closed subpath.
     If an existing bounding box is given in the ``box`` parameter, it is
     extended to encompass the path and returned. Otherwise, a new bounding box
     is created and returned.
 
     """
 
-    # Get the transform
+    # Split the path into segments and apply any transform. Each subpath is
+    # included, and the radii and angle of arcs are transformed as well as
+    # their endpoints.
+    segments = _path_segments(path.get('d'))
     transform = path.get('transform', None)
     if transform:
         transform = simpletransform.parseTransform(transform)
+        segments = _transform_segments(segments, transform)
+    objbox = _segments_bounding_box(segments)
 
-    # Parse the path details.
-    # Note that when parsing all path segments are converted to absolute
-    # coordinates. It also converts H and V segments to L, S segments to C and
-    # T segments to Q.
-    parsed = simplepath.parsePath(path.get('d'))
-
-    # Starting point
-    current = parsed[0][1]
-    if transform:
-        simpletransform.applyTransformToPoint(transform, current)
-    objbox = BoundingBox(current[0], current[0], current[1], current[1])
-
-    # Loop through each segment.
-    for type,params in parsed[1:]:
-        # End of path
-        if type == 'Z':
-            break
-
-        # Line or move to
-        elif type == 'L' or type == 'M':
-            point = params
-            if transform:
-                simpletransform.applyTransformToPoint(transform, point)
-            objbox.extend(point)
-            current = point
-
-        # Cubic Bézier curve
-        elif type == 'C':
-            p1 = params[0:2]
-            p2 = params[2:4]
-            p3 = params[4:6]
-            if transform:
-                simpletransform.applyTransformToPoint(transform, p1)
-                simpletransform.applyTransformToPoint(transform, p2)
-                simpletransform.applyTransformToPoint(transform, p3)
-            objbox = cubic_bounding_box(current, p1, p2, p3, objbox)
-            current = p3
-
-        # Quadratic Bézier curve
-        elif type == 'Q':
-            p1 = params[0:2]
-            p2 = params[2:4]
-            if transform:
-                simpletransform.applyTransformToPoint(transform, p1)
-                simpletransform.applyTransformToPoint(transform, p2)
-            objbox = quadratic_bounding_box(current, p1, p2, objbox)
-            current = p2
-
-        # Elliptical arc
-        elif type == 'A':
-            rx, ry, rotation, large_arc, sweep = params[0:5]
-            end = params[5:7]
-            if transform:
-                simpletransform.applyTransformToPoint(transform, end)
-            objbox = elliptical_arc_bounding_box(current, rx, ry, rotation,
-                                                 large_arc, sweep, end, objbox)
-            current = end
-
-        # Unknown segment type
-        else:
-            raise Exception(_('Unknown path segment type %s.' % type))
-
-    # Returnt the appropriate box
+    # Return the appropriate box
+    if objbox is None:
+        return box
     if box is None:
         return objbox
     else:
-        return box.combine(objbox)
+        box.combine(objbox)
+        return box
 
 def rect_bounding_box(rect, box=None):
     """Get the bounding box of an SVG rectangle.
@@ -625,10 +811,10 @@ def rect_bounding_box(rect, box=None):
     transform = rect.get('transform', None)
     if transform:
         transform = simpletransform.parseTransform(transform)
-        simpletransform.applyTransformToPoint(transform, bl)
-        simpletransform.applyTransformToPoint(transform, br)
-        simpletransform.applyTransformToPoint(transform, tr)
-        simpletransform.applyTransformToPoint(transform, tl)
+        bl = _transform_point(transform, bl)
+        br = _transform_point(transform, br)
+        tr = _transform_point(transform, tr)
+        tl = _transform_point(transform, tl)
 
     # Extend the box
     if box is None:
@@ -671,6 +857,914 @@ def object_bounding_box(obj, box=None):
 
     return objbox
 
+def object_bounding_boxes(objs):
+    """Get the bounding boxes of a number of SVG objects.
+
+    :param objs: An iterable of XML nodes defining the objects.
+    :return: A list containing a :class:`bounds.BoundingBox` for each object,
+             in the same order as ``objs``.
+
+    Documents often contain many objects with the same geometry but different
+    transforms, for example icons, repeated symbols or text converted to
+    paths. This function groups the objects by their geometry (the path data
+    or the position and size of a rectangle), so that the geometry of each
+    group is only parsed once. The segments of the geometry are then
+    transformed and measured for each object. Objects which also have the same
+    transform are only measured once.
+
+    Each object is given its own box, so modifying one of the boxes does not
+    affect the others. Objects which are not rendered give ``None``, and
+    objects which cannot be measured give an empty box at the origin, as per
+    :func:`bounds.object_bounding_box`.
+
+    """
+
+    segment_lists, indices = _group_object_segments(objs)
+    measured = [_segments_bounding_box(segments)
+                for segments in segment_lists]
+
+    boxes = []
+    for index in indices:
+        if index is None:
+            boxes.append(BoundingBox(0, 0, 0, 0))
+            continue
+        box = measured[index]
+        if box is None:
+            boxes.append(None)
+        else:
+            boxes.append(BoundingBox(box.left, box.right, box.bottom, box.top))
+
+    return boxes
+
+def _transform_point(transform, point):
+    """Apply a transform to a point without modifying the original point.
+
+    :param transform: The transformation matrix as returned by
+                      ``simpletransform.parseTransform``.
+    :param point: The point specified as a pair of numbers (x,y).
+    :return: The transformed point as a tuple (x,y).
+
+    """
+    return (transform[0][0]*point[0] + transform[0][1]*point[1] + transform[0][2],
+            transform[1][0]*point[0] + transform[1][1]*point[1] + transform[1][2])
+
+def _transform_arc(transform, rx, ry, rotation, sweep):
+    """Find the shape of an elliptical arc after it has been transformed.
+
+    :param transform: The transformation matrix as returned by
+                      ``simpletransform.parseTransform``.
+    :param rx: The x radius of the arc.
+    :param ry: The y radius of the arc.
+    :param rotation: The rotation of the x-axis of the arc in degrees.
+    :param sweep: Which direction the arc is swept in.
+    :return: A tuple ``(rx, ry, rotation, sweep)`` for the transformed arc.
+
+    An affine transformation maps an ellipse to another ellipse. The linear
+    part of the transform is combined with the rotation and radii of the arc
+    and decomposed into a rotation, a scaling and another rotation; the first
+    rotation and the scaling give the new ellipse. A reflection reverses the
+    direction of the sweep. The large arc flag is unaffected.
+
+    """
+
+    # Negative radii are treated as their absolute values. Using the signed
+    # values would flip the sign of the determinant below and hence wrongly
+    # reverse the sweep.
+    rx = abs(rx)
+    ry = abs(ry)
+
+    # Combine the linear part of the transform with the shape of the ellipse.
+    cos_rotation = cos(radians(rotation))
+    sin_rotation = sin(radians(rotation))
+    a = (transform[0][0]*cos_rotation + transform[0][1]*sin_rotation) * rx
+    b = (transform[0][1]*cos_rotation - transform[0][0]*sin_rotation) * ry
+    c = (transform[1][0]*cos_rotation + transform[1][1]*sin_rotation) * rx
+    d = (transform[1][1]*cos_rotation - transform[1][0]*sin_rotation) * ry
+
+    # Closed-form singular value decomposition of the 2x2 matrix.
+    e = (a + d) / 2.0
+    f = (a - d) / 2.0
+    g = (c + b) / 2.0
+    h = (c - b) / 2.0
+    q = hypot(e, h)
+    r = hypot(f, g)
+    angle = (atan2(h, e) + atan2(g, f)) / 2.0
+
+    # A negative determinant means the transform includes a reflection.
+    if a*d - b*c < 0:
+        sweep = not sweep
+
+    return q + r, abs(q - r), degrees(angle), sweep
+
+def _path_segments(d):
+    """Split SVG path data into its segments.
+
+    :param d: The path data as given in the ``d`` attribute of a path.
+    :return: A list of segments.
+
+    Each segment is a tuple whose first entry is the type of the segment and
+    whose remaining entries are its points and parameters:
+
+    * ``('M', p)`` for the start of a subpath.
+    * ``('L', p0, p1)`` for a straight line.
+    * ``('Q', p0, p1, p2)`` for a quadratic Bézier curve.
+    * ``('C', p0, p1, p2, p3)`` for a cubic Bézier curve.
+    * ``('A', p0, rx, ry, rotation, large_arc, sweep, p1)`` for an elliptical
+      arc.
+
+    All points are tuples (x,y) in the coordinate system of the path (i.e.,
+    before any transform has been applied).
+
+    """
+
+    # Parse the path details. All segments are converted to absolute
+    # coordinates, H and V segments to L, S segments to C and T segments to Q.
+    parsed = simplepath.parsePath(d)
+    segments = []
+    current = start = None
+
+    for type,params in parsed:
+        # Start of a subpath
+        if type == 'M':
+            current = start = tuple(params)
+            segments.append(('M', current))
+
+        # Close the subpath
+        elif type == 'Z':
+            segments.append(('L', current, start))
+            current = start
+
+        # Straight line
+        elif type == 'L':
+            point = tuple(params)
+            segments.append(('L', current, point))
+            current = point
+
+        # Cubic Bézier curve
+        elif type == 'C':
+            p1 = tuple(params[0:2])
+            p2 = tuple(params[2:4])
+            p3 = tuple(params[4:6])
+            segments.append(('C', current, p1, p2, p3))
+            current = p3
+
+        # Quadratic Bézier curve
+        elif type == 'Q':
+            p1 = tuple(params[0:2])
+            p2 = tuple(params[2:4])
+            segments.append(('Q', current, p1, p2))
+            current = p2
+
+        # Elliptical arc
+        elif type == 'A':
+            end = tuple(params[5:7])
+            segments.append(('A', current) + tuple(params[0:5]) + (end,))
+            current = end
+
+        # Unknown segment type
+        else:
+            raise Exception(_('Unknown path segment type %s.' % type))
+
+    return segments
+
+def _rect_segments(x, y, width, height):
+    """Get the segments forming the outline of a rectangle.
+
+    :param x: The x-value of the left of the rectangle.
+    :param y: The y-value of the bottom of the rectangle.
+    :param width: The width of the rectangle.
+    :param height: The height of the rectangle.
+    :return: A list of segments in the format used by :func:`_path_segments`.
+
+    """
+    bl = (x, y)
+    br = (x + width, y)
+    tr = (x + width, y + height)
+    tl = (x, y + height)
+    return [('M', bl), ('L', bl, br), ('L', br, tr), ('L', tr, tl),
+            ('L', tl, bl)]
+
+def _transform_segments(segments, transform):
+    """Apply a transform to a list of segments.
+
+    :param segments: The segments in the format used by
+                     :func:`_path_segments`.
+    :param transform: The transformation matrix as returned by
+                      ``simpletransform.parseTransform``.
+    :return: A new list of transformed segments.
+
+    """
+    transformed = []
+    for segment in segments:
+        if segment[0] == 'A':
+            p0, rx, ry, rotation, large_arc, sweep, p1 = segment[1:]
+            rx, ry, rotation, sweep = _transform_arc(transform, rx, ry,
+                                                     rotation, sweep != 0)
+            transformed.append(('A', _transform_point(transform, p0), rx, ry,
+                                rotation, large_arc, sweep,
+                                _transform_point(transform, p1)))
+        else:
+            transformed.append((segment[0],) +
+                               tuple(_transform_point(transform, p)
+                                     for p in segment[1:]))
+    return transformed
+
+def _geometry_key(obj):
+    """Get a key describing the geometry of an SVG object.
+
+    :param obj: The XML node defining the object.
+    :return: A hashable key, or ``None`` if the object is of a type which
+             cannot be measured.
+
+    Objects with the same key have identical geometry before their transforms
+    are applied, and so have the same segments. Whitespace in path data is
+    normalised so that trivially different formatting gives the same key.
+
+    """
+
+    if obj.tag == 'path' or obj.tag == inkex.addNS('path', 'svg'):
+        return ('path', ' '.join(obj.get('d').split()))
+    elif obj.tag in ['rect', inkex.addNS('rect', 'svg')]:
+        width = float(obj.get('width'))
+        height = float(obj.get('height'))
+        if width < 0:
+            raise ValueError(_('Width of rect object cannot be negative.'))
+        if height < 0:
+            raise ValueError(_('Height of rect object cannot be negative.'))
+        return ('rect', float(obj.get('x', 0)), float(obj.get('y', 0)), width,
+                height)
+    return None
+
+def _geometry_segments(key):
+    """Get the untransformed segments for the geometry described by a key.
+
+    :param key: A key as returned by :func:`_geometry_key`.
+    :return: A list of segments in the format used by :func:`_path_segments`.
+
+    """
+    if key[0] == 'path':
+        return _path_segments(key[1])
+
+    # Width or height of zero disables rendering of a rect.
+    if key[3] == 0 or key[4] == 0:
+        return []
+    return _rect_segments(*key[1:])
+
+def _group_object_segments(objs):
+    """Get the segments of a number of SVG objects, grouped by geometry.
+
+    :param objs: An iterable of XML nodes defining the objects.
+    :return: A tuple ``(segment_lists, indices)``.
+
+    ``segment_lists`` is a list of the unique lists of segments, in the format
+    used by :func:`_path_segments`, in image coordinates. ``indices`` gives the
+    index into ``segment_lists`` for each object, or ``None`` if the object is
+    of a type which cannot be measured. The geometry of each group of objects
+    is only parsed once, and objects which also have the same transform share
+    a list. Objects which are not rendered have an empty list.
+
+    All state is local so that concurrent calls do not interfere.
+
+    """
+    geometry = {}
+    unique = {}
+    segment_lists = []
+    indices = []
+    for obj in objs:
+        key = _geometry_key(obj)
+        if key is None:
+            indices.append(None)
+            continue
+
+        transform = obj.get('transform', None)
+        if (key, transform) not in unique:
+            if key not in geometry:
+                geometry[key] = _geometry_segments(key)
+            segments = geometry[key]
+            if transform:
+                matrix = simpletransform.parseTransform(transform)
+                segments = _transform_segments(segments, matrix)
+            unique[(key, transform)] = len(segment_lists)
+            segment_lists.append(segments)
+        indices.append(unique[(key, transform)])
+
+    return segment_lists, indices
+
+def _object_segments(obj):
+    """Get the segments making up an SVG object in image coordinates.
+
+    :param obj: The XML node defining the object.
+    :return: A list of segments in the format used by :func:`_path_segments`.
+
+    Any transform on the object is applied to the segments. Objects which are
+    not rendered, or which are of a type which cannot be measured, give an
+    empty list.
+
+    """
+    segment_lists, indices = _group_object_segments([obj])
+    if indices[0] is None:
+        return []
+    return segment_lists[0]
+
+def _segments_bounding_box(segments, box=None):
+    """Calculate the bounding box of a list of segments.
+
+    :param segments: The segments in the format used by
+                     :func:`_path_segments`.
+    :param box: The existing :class:`bounds.BoundingBox` if available.
+    :return: A :class:`bounds.BoundingBox` encompassing the segments, or the
+             value of ``box`` if there were no segments.
+
+    """
+    for segment in segments:
+        type = segment[0]
+        if type == 'M':
+            if box is None:
+                point = segment[1]
+                box = BoundingBox(point[0], point[0], point[1], point[1])
+            else:
+                box.extend(segment[1])
+        elif type == 'L':
+            if box is None:
+                box = BoundingBox(segment[1][0], segment[2][0],
+                                  segment[1][1], segment[2][1])
+            else:
+                box.extend(segment[1])
+                box.extend(segment[2])
+        elif type == 'C':
+            box = cubic_bounding_box(*(segment[1:] + (box,)))
+        elif type == 'Q':
+            box = quadratic_bounding_box(*(segment[1:] + (box,)))
+        elif type == 'A':
+            box = elliptical_arc_bounding_box(*(segment[1:] + (box,)))
+    return box
+
+def _segment_points(segment, directions):
+    """Find points on a segment which are extreme in the given directions.
+
+    :param segment: The segment in the format used by :func:`_path_segments`.
+    :param directions: A list of unit vectors (x,y).
+    :return: A list of points (x,y) lying on the segment.
+
+    The endpoints of the segment are always included, as are the points
+    furthest along (and furthest against) each direction. The convex hull of
+    the returned points approximates the convex hull of the segment more
+    closely as the number of directions increases.
+
+    """
+    type = segment[0]
+    if type == 'M' or type == 'L':
+        return list(segment[1:])
+
+    points = []
+    if type == 'Q':
+        p0, p1, p2 = segment[1:]
+        points.extend((p0, p2))
+        for u in directions:
+            t = _quadratic_extremum(p0[0]*u[0] + p0[1]*u[1],
+                                    p1[0]*u[0] + p1[1]*u[1],
+                                    p2[0]*u[0] + p2[1]*u[1])
+            if t is not None:
+                points.append(tuple(p0[i]*(1-t)**2 + p1[i]*2*(1-t)*t +
+                                    p2[i]*t**2 for i in (0, 1)))
+
+    elif type == 'C':
+        p0, p1, p2, p3 = segment[1:]
+        points.extend((p0, p3))
+        for u in directions:
+            ts = _cubic_extrema(p0[0]*u[0] + p0[1]*u[1],
+                                p1[0]*u[0] + p1[1]*u[1],
+                                p2[0]*u[0] + p2[1]*u[1],
+                                p3[0]*u[0] + p3[1]*u[1])
+            for t in ts:
+                points.append(tuple(p0[i]*(1-t)**3 + 3*p1[i]*t*(1-t)**2 +
+                                    3*p2[i]*(1-t)*t**2 + p3[i]*t**3
+                                    for i in (0, 1)))
+
+    elif type == 'A':
+        start, rx, ry, rotation, large_arc, sweep, end = segment[1:]
+        points.extend((start, end))
+        if start == end or rx == 0 or ry == 0:
+            return points
+        params = _arc_centre_parameters(start, rx, ry, rotation, large_arc,
+                                        sweep, end)
+        if params is None:
+            return points
+        cx, cy, rx, ry, theta1, dtheta = params
+        c = cos(radians(rotation))
+        s = sin(radians(rotation))
+        for u in directions:
+            # Angle at which the projection of the ellipse onto u is largest;
+            # the smallest is pi radians away.
+            t = atan2(ry * (u[1]*c - u[0]*s), rx * (u[0]*c + u[1]*s))
+            for t in (t, t + pi):
+                if dtheta >= 0:
+                    swept = (t - theta1) % (2*pi) <= dtheta
+                else:
+                    swept = (theta1 - t) % (2*pi) <= -dtheta
+                if swept:
+                    points.append((cx + rx*cos(t)*c - ry*sin(t)*s,
+                                   cy + rx*cos(t)*s + ry*sin(t)*c))
+
+    return points
+
+def convex_hull(points):
+    """Calculate the convex hull of a set of points.
+
+    :param points: An iterable of points, each a pair of numbers (x,y).
+    :return: A list of the vertices of the hull as tuples (x,y).
+
+    The vertices are returned in anti-clockwise order (assuming the y-axis
+    points upwards), starting from the vertex with the lowest x-value. Points
+    lying on the edges of the hull are not included. This uses Andrew's
+    monotone chain algorithm, which takes O(n log n) time for n points.
+
+    """
+
+    points = sorted(set((float(p[0]), float(p[1])) for p in points))
+    if len(points) < 3:
+        return points
+
+    # z-component of the cross product of the vectors o->a and o->b. Positive
+    # if o, a, b make an anti-clockwise turn.
+    def cross(o, a, b):
+        return (a[0] - o[0])*(b[1] - o[1]) - (a[1] - o[1])*(b[0] - o[0])
+
+    # Build the lower and upper halves of the hull.
+    lower = []
+    for p in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    upper = []
+    for p in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+
+    # The last point of each half is the first point of the other.
+    return lower[:-1] + upper[:-1]
+
+def _enclosing_rectangles(hull):
+    """Find the rectangles enclosing a convex polygon which have an edge
+    collinear with an edge of the polygon.
+
+    :param hull: The vertices of the polygon in anti-clockwise order, as
+                 returned by :func:`bounds.convex_hull`.
+    :return: A list of pairs ``(area, angle)``, one for each edge of the
+             polygon, giving the area of the rectangle and the angle of its
+             edge in degrees. The angles are in the range [0, 90).
+
+    The smallest enclosing rectangle is always one of these. Rotating calipers
+    are used to find the furthest vertices from each edge, so this takes O(n)
+    time.
+
+    """
+
+    n = len(hull)
+    if n < 2:
+        return [(0.0, 0.0)]
+    if n == 2:
+        return [(0.0, degrees(atan2(hull[1][1] - hull[0][1],
+                                    hull[1][0] - hull[0][0])) % 90.0)]
+
+    def dot(p, u):
+        return p[0]*u[0] + p[1]*u[1]
+
+    rectangles = []
+    j = 1
+    for i in range(n):
+        p = hull[i]
+        q = hull[(i + 1) % n]
+        length = sqrt((q[0] - p[0])**2 + (q[1] - p[1])**2)
+        e = ((q[0] - p[0])/length, (q[1] - p[1])/length)
+        normal = (-e[1], e[0])
+
+        # Advance the calipers: j is furthest along the edge, k furthest from
+        # it and l furthest back along it. Each only ever moves forward.
+        while dot(hull[(j + 1) % n], e) > dot(hull[j], e):
+            j = (j + 1) % n
+        if i == 0:
+            k = j
+        while dot(hull[(k + 1) % n], normal) > dot(hull[k], normal):
+            k = (k + 1) % n
+        if i == 0:
+            l = k
+        while dot(hull[(l + 1) % n], e) < dot(hull[l], e):
+            l = (l + 1) % n
+
+        area = ((dot(hull[j], e) - dot(hull[l], e)) *
+                (dot(hull[k], normal) - dot(p, normal)))
+        rectangles.append((area, degrees(atan2(e[1], e[0])) % 90.0))
+
+    return rectangles
+
+# Refinement of oriented bounding boxes; see oriented_bounding_box(). Every
+# orientation of the hull whose rectangle is within _REFINE_MARGIN of the
+# smallest is refined, up to _REFINE_CANDIDATES of them, by sampling the exact
+# area at _REFINE_SAMPLES angles either side.
+_REFINE_MARGIN = 0.02
+_REFINE_CANDIDATES = 8
+_REFINE_SAMPLES = 8
+
+def _rotated_bounding_box(segments, angle):
+    """Measure segments exactly in a rotated coordinate system.
+
+    :param segments: The segments in the format used by
+                     :func:`_path_segments`.
+    :param angle: The angle of the rotated x-axis in degrees.
+    :return: A :class:`bounds.OrientedBoundingBox` with an angle in the range
+             [0, 90).
+
+    """
+    angle = angle % 90.0
+    c = cos(radians(angle))
+    s = sin(radians(angle))
+    rotated = _transform_segments(segments, [[c, s, 0.0], [-s, c, 0.0]])
+    return OrientedBoundingBox(_segments_bounding_box(rotated), angle)
+
+def _refine_orientation(segments, angle, step, tolerance):
+    """Search for the smallest exact bounding box near an orientation.
+
+    :param segments: The segments in the format used by
+                     :func:`_path_segments`.
+    :param angle: The orientation to search around, in degrees.
+    :param step: The spacing, in degrees, of the angles sampled either side of
+                 ``angle``.
+    :param tolerance: The precision, in degrees, of the final search.
+    :return: The smallest :class:`bounds.OrientedBoundingBox` found.
+
+    """
+
+    # Sample the area to find the best neighbourhood.
+    samples = [angle + i*step for i in range(-_REFINE_SAMPLES,
+                                              _REFINE_SAMPLES + 1)]
+    boxes = [_rotated_bounding_box(segments, x) for x in samples]
+    i = min(range(len(boxes)), key=lambda i: boxes[i].area())
+    best = boxes[i]
+
+    # Golden-section search within that neighbourhood.
+    ratio = (sqrt(5.0) - 1.0) / 2.0
+    low = samples[i] - step
+    high = samples[i] + step
+    x1 = high - ratio*(high - low)
+    x2 = low + ratio*(high - low)
+    box1 = _rotated_bounding_box(segments, x1)
+    box2 = _rotated_bounding_box(segments, x2)
+    while high - low > tolerance:
+        if box1.area() < box2.area():
+            high, x2, box2 = x2, x1, box1
+            x1 = high - ratio*(high - low)
+            box1 = _rotated_bounding_box(segments, x1)
+        else:
+            low, x1, box1 = x1, x2, box2
+            x2 = low + ratio*(high - low)
+            box2 = _rotated_bounding_box(segments, x2)
+
+    for box in (box1, box2):
+        if box.area() < best.area():
+            best = box
+    return best
+
+def oriented_bounding_box(obj, directions=16, tolerance=1e-4):
+    """Get a close-fitting oriented bounding box of an SVG object.
+
+    :param obj: The XML node defining the object.
+    :param directions: The number of directions to find extrema in when
+                       approximating the convex hull of curved segments.
+    :param tolerance: The precision, in degrees, to which the orientation is
+                      refined.
+    :return: A :class:`bounds.OrientedBoundingBox` encompassing the object, or
+             ``None`` if the object is not rendered or cannot be measured.
+
+    Unlike the other functions in this module, the box returned is not
+    necessarily aligned with the axes of the image. It is instead rotated to
+    enclose the object in as small an area as possible.
+
+    The extrema of each segment of the object in a number of evenly spaced
+    directions are found using the same solvers as the axis-aligned functions.
+    The convex hull of these points is then calculated, and the rotating
+    calipers method used to find the orientation of the smallest rectangle
+    enclosing the hull. For objects made only of straight lines the hull is
+    exact and so is this orientation.
+
+    For curved objects the hull is only approximate, so the orientation is then
+    refined using the exact area of the box. Each orientation of the hull
+    whose rectangle is within 2% of the smallest is a candidate. Around each
+    candidate the exact area is sampled at a number of angles within half the
+    spacing of the directions (``90/directions`` degrees) either side, and a
+    golden-section search around the best of these finds the orientation to
+    within ``tolerance`` degrees. As this is a local search, the result is not
+    guaranteed to be the smallest box. If an object's smallest box is missed,
+    increasing ``directions`` gives a more accurate hull and hence better
+    candidates.
+
+    The returned box is always the exact bounding box of the object in its
+    orientation, so it encloses the whole object. If the axis-aligned bounding
+    box is no larger, it is returned instead (with an angle of zero). In
+    particular, an object with no area, such as a path consisting of a single
+    point, gives a box of zero area with an angle of zero.
+
+    Currently, this function can only handle ``path`` and ``rect`` objects.
+
+    """
+
+    segments = _object_segments(obj)
+    if not segments:
+        return None
+
+    # Find the extreme points of each segment.
+    units = [(cos(pi*i/directions), sin(pi*i/directions))
+             for i in range(directions)]
+    points = []
+    for segment in segments:
+        points.extend(_segment_points(segment, units))
+
+    # Find the best orientation of the hull, and measure the object exactly in
+    # that orientation. For objects made only of straight lines the hull is
+    # exact, so this is the smallest box.
+    rectangles = sorted(_enclosing_rectangles(convex_hull(points)))
+    best = _rotated_bounding_box(segments, rectangles[0][1])
+
+    # Otherwise, refine the orientation using the exact area. The hull is only
+    # approximate, so the best orientation of the object may be near any of the
+    # orientations giving a rectangle only a little larger than the smallest.
+    # The exact area can also have several local minima near each of these,
+    # so it is first sampled at a number of angles, and a golden-section
+    # search used around the best of these.
+    if any(segment[0] in 'QCA' for segment in segments):
+        step = 90.0 / directions / _REFINE_SAMPLES
+        candidates = []
+        for area, angle in rectangles:
+            if area > rectangles[0][0] * (1 + _REFINE_MARGIN):
+                break
+            if len(candidates) == _REFINE_CANDIDATES:
+                break
+            if any(abs((x - angle + 45.0) % 90.0 - 45.0) < 90.0 / directions
+                   for x in candidates):
+                continue
+            candidates.append(angle)
+
+        for angle in candidates:
+            box = _refine_orientation(segments, angle, step, tolerance)
+            if box.area() < best.area():
+                best = box
+
+    # The axis-aligned box can occasionally be smaller.
+    aabb = OrientedBoundingBox(_segments_bounding_box(segments), 0.0)
+    if aabb.area() <= best.area():
+        return aabb
+    return best
+
+def quadratic_bounding_boxes(p0, p1, p2):
+    """Calculate the bounding boxes of many quadratic Bézier curves at once.
+
+    :param p0: The start points of the curves.
+    :param p1: The control points of the curves.
+    :param p2: The end points of the curves.
+    :return: A NumPy array of shape (n, 4) whose columns are the left, right,
+             bottom and top edges of each box.
+
+    Each parameter is an array-like of shape (n, 2) containing one point per
+    curve. The calculations are the same as
+    :func:`bounds.quadratic_bounding_box` but are carried out on whole arrays.
+    NumPy releases the global interpreter lock while doing so, and nothing is
+    modified, so this can be called from several threads at once. If there
+    are no curves, an array of shape (0, 4) is returned.
+
+    This function requires NumPy to be installed.
+
+    """
+
+    import numpy
+    # Reshape so that an empty list of curves still has two columns.
+    p0 = numpy.asarray(p0, dtype=float).reshape((-1, 2))
+    p1 = numpy.asarray(p1, dtype=float).reshape((-1, 2))
+    p2 = numpy.asarray(p2, dtype=float).reshape((-1, 2))
+
+    # Extrema location in each axis. The division is done for every curve and
+    # the invalid results masked out afterwards.
+    d0 = p1 - p0
+    d1 = p2 - p1
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        t = numpy.where(d0 != d1, d0 / (d0 - d1), numpy.nan)
+    valid = (t > 0.0) & (t < 1.0)
+    values = p0*(1 - t)**2 + p1*2*(1 - t)*t + p2*t**2
+
+    low = numpy.minimum(p0, p2)
+    high = numpy.maximum(p0, p2)
+    low = numpy.where(valid, numpy.minimum(low, values), low)
+    high = numpy.where(valid, numpy.maximum(high, values), high)
+    return numpy.column_stack((low[:, 0], high[:, 0], low[:, 1], high[:, 1]))
+
+def cubic_bounding_boxes(p0, p1, p2, p3):
+    """Calculate the bounding boxes of many cubic Bézier curves at once.
+
+    :param p0: The start points of the curves.
+    :param p1: The first control points of the curves.
+    :param p2: The second control points of the curves.
+    :param p3: The end points of the curves.
+    :return: A NumPy array of shape (n, 4) whose columns are the left, right,
+             bottom and top edges of each box.
+
+    Each parameter is an array-like of shape (n, 2) containing one point per
+    curve. The calculations are the same as :func:`bounds.cubic_bounding_box`
+    but are carried out on whole arrays. NumPy releases the global interpreter
+    lock while doing so, and nothing is modified, so this can be called from
+    several threads at once. If there are no curves, an array of shape (0, 4)
+    is returned.
+
+    This function requires NumPy to be installed.
+
+    """
+
+    import numpy
+    # Reshape so that an empty list of curves still has two columns.
+    p0 = numpy.asarray(p0, dtype=float).reshape((-1, 2))
+    p1 = numpy.asarray(p1, dtype=float).reshape((-1, 2))
+    p2 = numpy.asarray(p2, dtype=float).reshape((-1, 2))
+    p3 = numpy.asarray(p3, dtype=float).reshape((-1, 2))
+
+    # Coefficients of the derivative as in _cubic_extrema() (a is actually 2a).
+    a = 6*(p1 - p0) - 12*(p2 - p1) + 6*(p3 - p2)
+    b = -6*(p1 - p0) + 6*(p2 - p1)
+    c = 3*(p1 - p0)
+    discriminant = b**2 - 2*a*c
+    real = discriminant >= 0
+    root = numpy.sqrt(numpy.where(real, discriminant, 0.0))
+    q = numpy.where(b < 0, (-b + root) / 2.0, (-b - root) / 2.0)
+
+    # Both roots are calculated for every curve and the invalid ones masked
+    # out afterwards.
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        roots = (numpy.where(a != 0, 2*q / a, numpy.nan),
+                 numpy.where(q != 0, c / q, numpy.nan))
+
+    low = numpy.minimum(p0, p3)
+    high = numpy.maximum(p0, p3)
+    for t in roots:
+        valid = real & (t > 0.0) & (t < 1.0)
+        values = (p0*(1 - t)**3 + 3*p1*t*(1 - t)**2 + 3*p2*(1 - t)*t**2 +
+                  p3*t**3)
+        low = numpy.where(valid, numpy.minimum(low, values), low)
+        high = numpy.where(valid, numpy.maximum(high, values), high)
+    return numpy.column_stack((low[:, 0], high[:, 0], low[:, 1], high[:, 1]))
+
+def _measure_segment_lists(segment_lists):
+    """Measure a number of lists of segments.
+
+    :param segment_lists: A list of lists of segments in the format used by
+                          :func:`_path_segments`.
+    :return: A list containing an :class:`bounds.ImmutableBoundingBox` (or
+             ``None`` for an empty list) for each list of segments.
+
+    If NumPy is available, all the Bézier curves are measured together with
+    :func:`bounds.quadratic_bounding_boxes` and
+    :func:`bounds.cubic_bounding_boxes`, and the results reduced to one box per
+    list. Elliptical arcs are measured individually. Without NumPy, each list
+    is measured with the scalar functions.
+
+    """
+
+    try:
+        import numpy
+    except ImportError:
+        results = []
+        for segments in segment_lists:
+            box = _segments_bounding_box(segments)
+            if box is None:
+                results.append(None)
+            else:
+                results.append(ImmutableBoundingBox(box.left, box.right,
+                                                    box.bottom, box.top))
+        return results
+
+    # Sort the segments by type, recording which list each came from. Points
+    # and arcs are turned straight into boxes.
+    boxes = []
+    owners = []
+    quadratics = ([], [], [])
+    quadratic_owners = []
+    cubics = ([], [], [], [])
+    cubic_owners = []
+    for owner, segments in enumerate(segment_lists):
+        for segment in segments:
+            type = segment[0]
+            if type == 'M' or type == 'L':
+                for point in segment[1:]:
+                    boxes.append((point[0], point[0], point[1], point[1]))
+                    owners.append(owner)
+            elif type == 'Q':
+                for points, point in zip(quadratics, segment[1:]):
+                    points.append(point)
+                quadratic_owners.append(owner)
+            elif type == 'C':
+                for points, point in zip(cubics, segment[1:]):
+                    points.append(point)
+                cubic_owners.append(owner)
+            elif type == 'A':
+                box = elliptical_arc_bounding_box(*segment[1:])
+                if box is not None:
+                    boxes.append((box.left, box.right, box.bottom, box.top))
+                    owners.append(owner)
+
+    # Measure the curves and gather all the boxes together.
+    arrays = [numpy.array(boxes, dtype=float).reshape((-1, 4))]
+    if quadratic_owners:
+        arrays.append(quadratic_bounding_boxes(*quadratics))
+        owners.extend(quadratic_owners)
+    if cubic_owners:
+        arrays.append(cubic_bounding_boxes(*cubics))
+        owners.extend(cubic_owners)
+    boxes = numpy.concatenate(arrays)
+    owners = numpy.array(owners, dtype=int)
+
+    # Reduce the boxes to one per list.
+    results = [None] * len(segment_lists)
+    if len(owners) == 0:
+        return results
+    order = numpy.argsort(owners, kind='mergesort')
+    boxes = boxes[order]
+    owners = owners[order]
+    starts = numpy.flatnonzero(numpy.r_[True, owners[1:] != owners[:-1]])
+    edges = zip(owners[starts].tolist(),
+                numpy.minimum.reduceat(boxes[:, 0], starts).tolist(),
+                numpy.maximum.reduceat(boxes[:, 1], starts).tolist(),
+                numpy.minimum.reduceat(boxes[:, 2], starts).tolist(),
+                numpy.maximum.reduceat(boxes[:, 3], starts).tolist())
+    for owner, left, right, bottom, top in edges:
+        results[owner] = ImmutableBoundingBox(left, right, bottom, top)
+    return results
+
+def measure(obj):
+    """Get the bounding box of an SVG object without side effects.
+
+    :param obj: The XML node defining the object.
+    :return: An :class:`bounds.ImmutableBoundingBox` encompassing the object,
+             or ``None`` if the object is not rendered or cannot be measured.
+
+    This is an alternative to :func:`bounds.object_bounding_box` for use in
+    threaded programs. It does not modify the object, its attributes or any
+    other arguments, keeps no state between calls and returns a new immutable
+    box. Several threads may measure objects at the same time, provided the
+    documents they belong to are not being modified.
+
+    A single object is measured with the scalar functions, as the overhead of
+    building arrays would outweigh any benefit from NumPy.
+
+    """
+    box = _segments_bounding_box(_object_segments(obj))
+    if box is None:
+        return None
+    return ImmutableBoundingBox(box.left, box.right, box.bottom, box.top)
+
+def measure_all(objs):
+    """Get the bounding boxes of a number of SVG objects without side
+    effects.
+
+    :param objs: An iterable of XML nodes defining the objects.
+    :return: A list containing an :class:`bounds.ImmutableBoundingBox` (or
+             ``None``) for each object, in the same order as ``objs``.
+
+    Like :func:`bounds.object_bounding_boxes`, objects with the same geometry
+    are only parsed once, and objects with the same geometry and transform are
+    only measured once. As the boxes are immutable, such objects share the
+    same box. Where NumPy is available, all the Bézier curves are measured in
+    a single batch with :func:`bounds.quadratic_bounding_boxes` and
+    :func:`bounds.cubic_bounding_boxes`; NumPy releases the global interpreter
+    lock while doing so, which allows other threads to run.
+
+    As with :func:`bounds.measure`, this is safe to call from several threads
+    at once. Unlike the other functions in this module, objects which cannot
+    be measured give ``None`` rather than an empty box at the origin.
+
+    """
+
+    segment_lists, indices = _group_object_segments(objs)
+    boxes = _measure_segment_lists(segment_lists)
+    return [None if i is None else boxes[i] for i in indices]
+
+def _bounding_box_element(box, style):
+    """Create an SVG path element outlining the given bounding box.
+
+    :param box: The :class:`bounds.BoundingBox` to outline.
+    :param style: The SVG style to draw the outline with.
+    :return: The new XML node. It is not attached to any document.
+
+    """
+
+    # Convert the bounding box to path data
+    points = (box.left, box.bottom, box.right, box.bottom,
+              box.right, box.top, box.left, box.top)
+    d = 'M%f %f %f %f %f %f %f %f z' % points
+
+    # Create the new node
+    boxobj = inkex.etree.Element('path')
+    if style is not None:
+        boxobj.set('style', style)
+    boxobj.set('d', d)
+    return boxobj
+
 def draw_bounding_box(obj, style=None, replace=False):
     """Draws the bounding box of the given object.
 
@@ -682,7 +1776,12 @@ def draw_bounding_box(obj, style=None, replace=False):
     is specified, the style of the object is used to draw the bounding box. If
     ``replace`` is ``True``, the object is removed from the image and is
     replaced by its bounding box. If it is ``False``, the bounding box is drawn
-    on top of the object.
+    on top of the object. Objects which are not rendered (for example, a
+    rectangle with a width of zero) have no bounding box, so nothing is drawn
+    for them.
+
+    To draw the bounding boxes of a large number of objects, use
+    :func:`bounds.draw_bounding_boxes` instead.
 
     """
 
@@ -690,25 +1789,345 @@ def draw_bounding_box(obj, style=None, replace=False):
     if style is None:
         style = obj.get('style')
 
-    # Get the bounding box
+    # Get the bounding box and create the outline. Objects which are not
+    # rendered have no bounding box to draw.
     box = object_bounding_box(obj)
+    if box is not None:
+        boxobj = _bounding_box_element(box, style)
 
-    # Convert the bounding box to path data
-    points = (box.left, box.bottom, box.right, box.bottom,
-              box.right, box.top, box.left, box.top)
-    d = 'M%f %f %f %f %f %f %f %f z' % points
+        # Insert the box outline directly after the object. This avoids having
+        # to search the parent for the position of the object.
+        obj.addnext(boxobj)
 
-    # Create the new node
-    boxobj = inkex.etree.Element('path')
-    boxobj.set('style', style)
-    boxobj.set('d', d)
+    # Remove the object if desired
+    if replace:
+        obj.getparent().remove(obj)
+
+def draw_bounding_boxes(objs, style=None, replace=False, layer=None):
+    """Draws the bounding boxes of a number of objects.
+
+    :param objs: An iterable of XML nodes representing the objects.
+    :param style: The SVG style to draw the bounding boxes with.
+    :param replace: Whether to replace the objects with their bounding boxes.
+    :param layer: The XML node of a group or layer to draw the boxes in.
+    :return: A list of the new bounding box nodes, in the same order as
+             ``objs``. Objects which are not rendered have no bounding box
+             and give ``None``. An object given more than once is only drawn
+             once, and only appears once in the list.
+
+    This is the equivalent of calling :func:`bounds.draw_bounding_box` for each
+    object, but is designed for large selections. All the objects are measured
+    first with :func:`bounds.object_bounding_boxes`, and then the bounding
+    boxes are inserted with a single pass through the children of each parent,
+    rather than searching the parent for the position of every object.
+
+    If no style is specified, the style of each object is used to draw its
+    bounding box. If ``layer`` is ``None``, each bounding box is drawn directly
+    on top of its object. Otherwise, all of the bounding boxes are appended to
+    the given group or layer in the order the objects were given. If
+    ``replace`` is ``True``, the objects are removed from the image.
 
-    # Get the parent of the object
-    parent = obj.getparent()
+    """
 
-    # Insert the box outline
-    parent.insert(parent.index(obj) + 1, boxobj)
+    # Remove any duplicate objects, keeping the first occurrence of each.
+    unique = []
+    seen = set()
+    for obj in objs:
+        if obj not in seen:
+            seen.add(obj)
+            unique.append(obj)
+    objs = unique
+
+    # Measure all the objects, keeping track of which boxes belong to each
+    # parent. The parents are stored in a list so they are processed in a
+    # predictable order.
+    boxobjs = []
+    parents = []
+    children = {}
+    for obj, box in zip(objs, object_bounding_boxes(objs)):
+        if box is None:
+            boxobj = None
+        elif style is None:
+            boxobj = _bounding_box_element(box, obj.get('style'))
+        else:
+            boxobj = _bounding_box_element(box, style)
+        boxobjs.append(boxobj)
+
+        parent = obj.getparent()
+        if parent not in children:
+            children[parent] = {}
+            parents.append(parent)
+        children[parent][obj] = boxobj
+
+    # Drawing in a separate layer is simple: the boxes go on the end of the
+    # layer, and the objects are removed if desired.
+    if layer is not None:
+        for boxobj in boxobjs:
+            if boxobj is not None:
+                layer.append(boxobj)
+        if replace:
+            for parent in parents:
+                for obj in children[parent]:
+                    parent.remove(obj)
+        return boxobjs
+
+    # Otherwise, rebuild the list of children of each parent with the boxes
+    # inserted after (or in place of) their objects.
+    for parent in parents:
+        boxes = children[parent]
+        ordered = []
+        for child in parent:
+            if child in boxes:
+                if not replace:
+                    ordered.append(child)
+                if boxes[child] is not None:
+                    ordered.append(boxes[child])
+            else:
+                ordered.append(child)
+        parent[:] = ordered
+
+    return boxobjs
+
+def write_boxes(filename, items):
+    """Write bounding boxes to a binary file.
+
+    :param filename: The name of the file to write.
+    :param items: An iterable of pairs ``(id, box)`` where ``id`` is the id of
+                  an element (or ``None``) and ``box`` is its
+                  :class:`bounds.BoundingBox` (or ``None``).
+
+    The file is designed so that the boxes can be memory-mapped and used
+    without parsing; see :func:`bounds.map_boxes`. All values are stored
+    little-endian. It consists of:
+
+    * A 32 byte header: the eight bytes ``PYBOUNDS``, the format version and a
+      reserved field (both unsigned 32-bit integers), the number of boxes *n*
+      and the size of the string table in bytes (both unsigned 64-bit
+      integers).
+    * Four columns of *n* 64-bit floating point numbers giving the left,
+      right, bottom and top edges of each box in turn. A box of ``None`` is
+      stored as NaN in every column.
+    * *n* + 1 unsigned 64-bit integers giving the offsets of the start of each
+      id in the string table, followed by the end of the last id.
+    * The string table, containing the UTF-8 encoded ids one after the other.
+      An id of ``None`` is stored as an empty string.
+
+    As the header and each column are a multiple of eight bytes long, all the
+    numbers are aligned.
 
-    # Remove the object if desired
-    if replace:
-       parent.remove(node)
+    """
+
+    # Split the items into columns.
+    nan = float('nan')
+    columns = (array('d'), array('d'), array('d'), array('d'))
+    offsets = [0]
+    ids = []
+    for id, box in items:
+        if box is None:
+            values = (nan, nan, nan, nan)
+        else:
+            values = (box.left, box.right, box.bottom, box.top)
+        for column, value in zip(columns, values):
+            column.append(value)
+
+        if id is None:
+            id = b''
+        elif not isinstance(id, bytes):
+            id = id.encode('utf-8')
+        ids.append(id)
+        offsets.append(offsets[-1] + len(id))
+
+    count = len(ids)
+    if sys.byteorder != 'little':
+        for column in columns:
+            column.byteswap()
+
+    f = open(filename, 'wb')
+    try:
+        f.write(_BOXFILE_HEADER.pack(_BOXFILE_MAGIC, _BOXFILE_VERSION, 0,
+                                     count, offsets[-1]))
+        for column in columns:
+            column.tofile(f)
+        f.write(struct.pack('<%dQ' % (count + 1), *offsets))
+        f.write(b''.join(ids))
+    finally:
+        f.close()
+
+def _read_box_header(f):
+    """Read and check the header of a binary bounding box file.
+
+    :param f: The file, positioned at its start.
+    :return: A tuple ``(count, table_size)`` giving the number of boxes and the
+             size of the string table in bytes.
+
+    The size of the file is checked against the header, so the rest of the
+    file can be read without checking the length of each read.
+
+    """
+    header = f.read(_BOXFILE_HEADER.size)
+    if len(header) != _BOXFILE_HEADER.size:
+        raise ValueError(_('File is too short to be a bounding box file.'))
+    magic, version, reserved, count, table_size = _BOXFILE_HEADER.unpack(header)
+    if magic != _BOXFILE_MAGIC:
+        raise ValueError(_('File is not a bounding box file.'))
+    if version != _BOXFILE_VERSION:
+        raise ValueError(_('Unsupported bounding box file version %d.') % version)
+    size = (_BOXFILE_HEADER.size + 32 * count + 8 * (count + 1) +
+            table_size)
+    if os.fstat(f.fileno()).st_size < size:
+        raise ValueError(_('File is too short to be a bounding box file.'))
+    return count, table_size
+
+def _check_box_offsets(first, last, ordered, table_size):
+    """Check the id offsets read from a binary bounding box file.
+
+    :param first: The first offset.
+    :param last: The last offset.
+    :param ordered: If each offset is at least as large as the one before it.
+    :param table_size: The size of the string table as given in the header.
+
+    Each id must lie within the string table and follow the previous one.
+
+    """
+    if first != 0 or last > table_size or not ordered:
+        raise ValueError(_('Invalid id offsets in bounding box file.'))
+
+def read_boxes(filename):
+    """Read bounding boxes from a binary file.
+
+    :param filename: The name of the file to read.
+    :return: A list of pairs ``(id, box)`` in the order they were written.
+
+    The file must have been created by :func:`bounds.write_boxes`. Each id is
+    returned as a string, with ``None`` in place of an empty id. Each box is a
+    new :class:`bounds.BoundingBox`, or ``None`` if none was written.
+
+    """
+
+    f = open(filename, 'rb')
+    try:
+        count, table_size = _read_box_header(f)
+        columns = []
+        for i in range(4):
+            column = array('d')
+            column.fromfile(f, count)
+            if sys.byteorder != 'little':
+                column.byteswap()
+            columns.append(column)
+        offsets = struct.unpack('<%dQ' % (count + 1), f.read(8 * (count + 1)))
+        table = f.read(table_size)
+    finally:
+        f.close()
+
+    # Sorting an already sorted list only takes a single pass.
+    offsets = list(offsets)
+    _check_box_offsets(offsets[0], offsets[-1], offsets == sorted(offsets),
+                       table_size)
+
+    # If the string table is all ASCII, the offsets are also the positions of
+    # the ids in the decoded table, so it only needs to be decoded once.
+    text = table.decode('utf-8')
+    if len(text) == len(table):
+        ids = [text[start:end] or None
+               for start, end in zip(offsets[:-1], offsets[1:])]
+    else:
+        ids = [table[start:end].decode('utf-8') or None
+               for start, end in zip(offsets[:-1], offsets[1:])]
+
+    items = []
+    for id, left, right, bottom, top in zip(ids, *columns):
+        if left != left:
+            items.append((id, None))
+        else:
+            items.append((id, BoundingBox(left, right, bottom, top)))
+    return items
+
+class MappedIds(object):
+    """The ids of the boxes in a memory-mapped bounding box file.
+
+    This behaves as a read-only sequence of strings, with an empty string
+    where no id was written. Each id is only decoded when it is accessed, so
+    no work is done for ids which are not used. The underlying data is
+    available as two read-only NumPy arrays which are views directly onto the
+    file:
+
+    * ``offsets``, of *n* + 1 unsigned 64-bit integers giving the start of
+      each id in the string table followed by the end of the last id.
+    * ``table``, the bytes of the UTF-8 encoded ids one after the other.
+
+    """
+
+    def __init__(self, offsets, table):
+        """Create the sequence from the mapped offsets and string table.
+
+        :param offsets: The offsets of the ids in the string table.
+        :param table: The string table.
+
+        """
+        self.offsets = offsets
+        self.table = table
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        """Get an id, or a list of ids if ``index`` is a slice."""
+        count = len(self)
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(count))]
+        if index < 0:
+            index += count
+        if index < 0 or index >= count:
+            raise IndexError(_('Id index out of range.'))
+        start = int(self.offsets[index])
+        end = int(self.offsets[index + 1])
+        return self.table[start:end].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+def map_boxes(filename):
+    """Memory-map the bounding boxes in a binary file as NumPy arrays.
+
+    :param filename: The name of the file to map.
+    :return: A tuple ``(ids, boxes)``.
+
+    The file must have been created by :func:`bounds.write_boxes`. ``ids`` is
+    a :class:`bounds.MappedIds` sequence of the element ids as strings (empty
+    where no id was written). ``boxes`` is a read-only ``numpy.memmap`` of
+    shape (4, *n*) whose rows are the left, right, bottom and top edges of the
+    boxes. Boxes which were written as ``None`` are NaN.
+
+    Nothing is parsed or copied for each box. The boxes, the id offsets and
+    the string table are all views directly onto the file, and each id is
+    only decoded when it is accessed. The offsets are checked with NumPy when
+    the file is mapped.
+
+    This function requires NumPy to be installed.
+
+    """
+
+    import numpy
+
+    f = open(filename, 'rb')
+    try:
+        count, table_size = _read_box_header(f)
+    finally:
+        f.close()
+
+    # Map the whole file once and take views of each part of it. Every part
+    # starts a multiple of eight bytes into the file so the views are aligned.
+    data = numpy.memmap(filename, dtype='u1', mode='r')
+    start = _BOXFILE_HEADER.size
+    boxes = data[start:start + 32*count].view('<f8').reshape((4, count))
+    start += 32 * count
+    offsets = data[start:start + 8*(count + 1)].view('<u8')
+    start += 8 * (count + 1)
+    table = data[start:start + table_size]
+
+    # The offsets are unsigned, so numpy.diff() would wrap around rather than
+    # giving a negative difference; compare neighbouring offsets instead.
+    _check_box_offsets(offsets[0], offsets[-1],
+                       bool((offsets[1:] >= offsets[:-1]).all()), table_size)
+    return MappedIds(offsets, table), boxes
@@ -0,0 +1,530 @@
+# -*- coding: utf-8 -*-
+"""
+Check the bounding box solvers in the bounds module against densely sampled
+ground truth.
+
+Copyright (C) 2010 Blair Bonnett, blair.bonnett@gmail.com
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Usage::
+
+    python boundscheck.py [--count N] [--samples N] [--seed N]
+
+A randomised corpus of quadratic and cubic Bézier curves and elliptical arcs
+is generated, including degenerate cases which have caused problems in the
+past. Each engine listed in ``ENGINES`` measures the whole corpus, and its
+boxes are compared to boxes found by sampling each segment at a large number
+of points. The largest error and the time taken relative to the exact scalar
+solvers are reported for each engine. The exit status is non-zero if any
+engine gives a box which does not match the sampled box.
+
+"""
+
+import optparse
+import random
+import sys
+import time
+from math import sqrt, hypot, sin, cos, asin, radians, atan2, pi, frexp, ldexp
+
+import bounds
+
+
+# Segment kinds, and the function in the bounds module which measures each.
+KINDS = ('quadratic', 'cubic', 'arc')
+SOLVERS = {
+    'quadratic': bounds.quadratic_bounding_box,
+    'cubic': bounds.cubic_bounding_box,
+    'arc': bounds.elliptical_arc_bounding_box,
+}
+
+# Segment type used in the segment lists of the bounds module for each kind.
+SEGMENT_TYPES = {'quadratic': 'Q', 'cubic': 'C', 'arc': 'A'}
+
+
+def _as_tuple(box):
+    """Convert a box to a tuple (left, right, bottom, top), or None."""
+    if box is None:
+        return None
+    if isinstance(box, bounds.BoundingBox):
+        return (box.left, box.right, box.bottom, box.top)
+    return tuple(box)
+
+
+def exact_engine(kind, cases):
+    """Measure each case with the exact scalar solvers."""
+    solver = SOLVERS[kind]
+    return [solver(*case) for case in cases]
+
+
+def segments_engine(kind, cases):
+    """Measure each case through the segment lists used by
+    bounds.object_bounding_boxes and bounds.oriented_bounding_box."""
+    type = SEGMENT_TYPES[kind]
+    return [bounds._segments_bounding_box([(type,) + tuple(case)])
+            for case in cases]
+
+
+def batch_engine(kind, cases):
+    """Measure all the cases together with the batch kernels used by
+    bounds.measure_all. The Bézier curves are measured with NumPy if it is
+    available."""
+    type = SEGMENT_TYPES[kind]
+    return bounds._measure_segment_lists([[(type,) + tuple(case)]
+                                          for case in cases])
+
+
+# Affine transforms used by transformed_engine, in the format returned by
+# simpletransform.parseTransform. They only swap, negate and scale up by powers
+# of two so that points are transformed exactly; otherwise rounding would swamp
+# arcs with nearly coincident endpoints. Scaling down could round subnormal
+# coordinates, but scaling back down after scaling up is always exact. The arc
+# shape still goes through the general calculation, which changes the rotation
+# and radii. The first is a rotation by 90 degrees with unequal scaling and the
+# second a reflection.
+TRANSFORMS = (
+    [[0.0, -2.0, 0.0], [8.0, 0.0, 0.0]],
+    [[-1.0, 0.0, 0.0], [0.0, 4.0, 0.0]],
+)
+
+
+def _invert_transform(m):
+    """Invert an affine transform."""
+    det = m[0][0]*m[1][1] - m[0][1]*m[1][0]
+    a = m[1][1] / det
+    b = -m[0][1] / det
+    c = -m[1][0] / det
+    d = m[0][0] / det
+    return [[a, b, -a*m[0][2] - b*m[1][2]], [c, d, -c*m[0][2] - d*m[1][2]]]
+
+
+def transformed_engine(kind, cases):
+    """Transform each case with one of TRANSFORMS and back again through the
+    segment code used for transformed objects, then measure it. Any error in
+    transforming a segment (for example, an arc with a negative radius) shows
+    up as a box which does not match the untransformed segment."""
+    type = SEGMENT_TYPES[kind]
+    boxes = []
+    for i, case in enumerate(cases):
+        transform = TRANSFORMS[i % len(TRANSFORMS)]
+        segments = bounds._transform_segments([(type,) + tuple(case)],
+                                              transform)
+        segments = bounds._transform_segments(segments,
+                                              _invert_transform(transform))
+        boxes.append(bounds._segments_bounding_box(segments))
+    return boxes
+
+
+# Engines to check. Each is a pair (name, function) where the function takes
+# a segment kind and a list of cases and returns a list of boxes (either
+# bounds.BoundingBox instances or (left, right, bottom, top) tuples, or None
+# for segments which are not drawn). The first engine is the baseline that
+# speedups are measured against.
+ENGINES = [
+    ('exact', exact_engine),
+    ('segments', segments_engine),
+    ('batch', batch_engine),
+    ('transformed', transformed_engine),
+]
+
+
+def _random_point(rng, scale=10.0):
+    return (rng.uniform(-scale, scale), rng.uniform(-scale, scale))
+
+
+def _degenerate_quadratic(rng):
+    p0 = _random_point(rng)
+    p1 = _random_point(rng)
+    p2 = _random_point(rng)
+    choice = rng.randint(0, 4)
+
+    # Control point midway between the ends (q0 == q1) in one or both axes.
+    if choice == 0:
+        p1 = ((p0[0] + p2[0]) / 2.0, p1[1])
+    elif choice == 1:
+        p1 = ((p0[0] + p2[0]) / 2.0, (p0[1] + p2[1]) / 2.0)
+
+    # Coincident points.
+    elif choice == 2:
+        p1 = p0
+    elif choice == 3:
+        p1 = p2 = p0
+
+    # Small integers give exact cancellations.
+    else:
+        p0, p1, p2 = [(rng.randint(-3, 3), rng.randint(-3, 3))
+                      for i in range(3)]
+    return (p0, p1, p2)
+
+
+def _degenerate_cubic(rng):
+    p0 = _random_point(rng)
+    p1 = _random_point(rng)
+    p2 = _random_point(rng)
+    p3 = _random_point(rng)
+    choice = rng.randint(0, 5)
+
+    # The coefficient a of the quadratic formula is zero in one or both axes.
+    if choice == 0:
+        p3 = (p0[0] - 3*p1[0] + 3*p2[0], p3[1])
+    elif choice == 1:
+        p0, p1, p2 = [(rng.randint(-5, 5), rng.randint(-5, 5))
+                      for i in range(3)]
+        p3 = (p0[0] - 3*p1[0] + 3*p2[0], p0[1] - 3*p1[1] + 3*p2[1])
+
+    # Coincident points.
+    elif choice == 2:
+        p1 = p0
+        p2 = p3
+    elif choice == 3:
+        p1 = p2 = p3 = p0
+
+    # Collinear points.
+    elif choice == 4:
+        d = _random_point(rng, 1.0)
+        p1, p2, p3 = [(p0[0] + s*d[0], p0[1] + s*d[1])
+                      for s in (rng.uniform(-5, 5), rng.uniform(-5, 5),
+                                rng.uniform(-5, 5))]
+
+    # Small integers give exact cancellations.
+    else:
+        p0, p1, p2, p3 = [(rng.randint(-3, 3), rng.randint(-3, 3))
+                          for i in range(4)]
+    return (p0, p1, p2, p3)
+
+
+def _random_arc(rng):
+    return (_random_point(rng), rng.uniform(-8, 8), rng.uniform(-8, 8),
+            rng.uniform(-360, 360), rng.randint(0, 1), rng.randint(0, 1),
+            _random_point(rng))
+
+
+def _degenerate_arc(rng):
+    start, rx, ry, rotation, large_arc, sweep, end = _random_arc(rng)
+    choice = rng.randint(0, 8)
+
+    # Tiny or subnormal radii, which are scaled up to join the endpoints.
+    if choice == 0:
+        rx = rng.choice((1e-9, 1e-150, 1e-300, 1e-310))
+        ry = rx * rng.uniform(0.1, 10)
+
+    # Tiny radii with endpoints closer together still, so no scaling is needed.
+    # The arc is placed at the origin so that it sets the tolerances.
+    elif choice == 7:
+        rx = rng.choice((1e-9, 1e-100, 1e-150, 1e-300))
+        ry = rx * rng.uniform(0.5, 2)
+        start = (0.0, 0.0)
+        end = (rx * rng.uniform(-0.5, 0.5), rx * rng.uniform(-0.5, 0.5))
+
+    # A zero radius, giving a straight line.
+    elif choice == 1:
+        rx = 0
+
+    # Coincident endpoints, which are not drawn.
+    elif choice == 2:
+        end = start
+
+    # Endpoints very close together.
+    elif choice == 3:
+        end = (start[0] + 1e-9, start[1] - 1e-9)
+
+    # Endpoints differing by a subnormal amount, so close together that the
+    # distance between them may underflow. The bounds module treats endpoints
+    # it cannot tell apart as coincident, so only the small arc is used.
+    elif choice == 8:
+        rx = rng.choice((1.0, 1e-300, 1e-310))
+        ry = rx * rng.uniform(0.5, 2)
+        start = (0.0, 0.0)
+        end = (rng.choice((5e-324, 1e-323, 3e-322)),
+               rng.choice((0.0, -5e-324, 2e-323)))
+        large_arc = 0
+
+    # Huge radii.
+    elif choice == 4:
+        rx = rng.uniform(1e5, 1e7)
+        ry = rng.uniform(1e5, 1e7)
+
+    # Axis-aligned rotations.
+    elif choice == 5:
+        rotation = rng.choice((-180, -90, 0, 90, 180, 270))
+
+    # Non-zero flags other than one.
+    else:
+        large_arc = rng.choice((2, -1))
+        sweep = rng.choice((3, -2))
+
+    return (start, rx, ry, rotation, large_arc, sweep, end)
+
+
+def generate_cases(kind, count, rng, degenerate=0.25):
+    """Generate a list of random cases of the given kind.
+
+    :param kind: One of the entries in KINDS.
+    :param count: The number of cases to generate.
+    :param rng: The random.Random instance to use.
+    :param degenerate: The proportion of cases which should be degenerate.
+    :return: A list of cases, each a tuple of the arguments to the solver.
+
+    """
+    cases = []
+    for i in range(count):
+        if rng.random() < degenerate:
+            if kind == 'quadratic':
+                cases.append(_degenerate_quadratic(rng))
+            elif kind == 'cubic':
+                cases.append(_degenerate_cubic(rng))
+            else:
+                cases.append(_degenerate_arc(rng))
+        else:
+            if kind == 'quadratic':
+                cases.append(tuple(_random_point(rng) for j in range(3)))
+            elif kind == 'cubic':
+                cases.append(tuple(_random_point(rng) for j in range(4)))
+            else:
+                cases.append(_random_arc(rng))
+    return cases
+
+
+def _sample_arc(start, rx, ry, rotation, large_arc, sweep, end, samples):
+    """Sample points along an elliptical arc. This follows the geometry of
+    appendix F.6.5 of the SVG 1.1 specification, but finds the centre in a
+    frame where the ellipse is stretched into a circle rather than using the
+    formula there, so that it does not share any rounding or underflow with
+    the code in the bounds module."""
+    if start == end:
+        return []
+    if rx == 0 or ry == 0:
+        return [start, end]
+    rx = abs(rx)
+    ry = abs(ry)
+    c = cos(radians(rotation))
+    s = sin(radians(rotation))
+
+    # Scale the chord by a power of two, which is exact, so that its direction
+    # survives the rotation even when its length is subnormal.
+    dx = start[0] - end[0]
+    dy = start[1] - end[1]
+    exponent = frexp(max(abs(dx), abs(dy)))[1]
+    dx = ldexp(dx, -exponent)
+    dy = ldexp(dy, -exponent)
+    x1 = c*dx + s*dy
+    y1 = -s*dx + c*dy
+
+    # Stretch the y-axis so the ellipse is a circle of radius rx, and find
+    # the direction and half-length of the chord in that frame.
+    k = rx / ry
+    length = hypot(x1, y1 * k)
+    u = x1 / length
+    v = y1 * k / length
+    half = ldexp(length, exponent - 1)
+    if half == 0:
+        return [start, end]
+
+    # A circle too small to join the endpoints is scaled up until the chord
+    # is a diameter. Otherwise the centre lies on the perpendicular bisector
+    # of the chord at a distance found by Pythagoras. The roots are taken
+    # separately so the product cannot underflow for tiny radii.
+    if half >= rx:
+        rx = half
+        ry = half / k
+        cu = cv = 0.0
+    else:
+        distance = sqrt(rx - half) * sqrt(rx + half)
+        if (large_arc != 0) == (sweep != 0):
+            distance = -distance
+        cu = distance * v
+        cv = -distance * u
+    cxp = cu
+    cyp = cv / k
+    cx = c*cxp - s*cyp + (start[0] + end[0]) / 2.0
+    cy = s*cxp + c*cyp + (start[1] + end[1]) / 2.0
+
+    # Angles are unchanged by scaling the circle, so measure them in the
+    # stretched frame to avoid dividing by the radii. The angle subtended by
+    # the chord is found from its length rather than the difference of the
+    # angles of the endpoints, which is lost to rounding for tiny chords.
+    theta1 = atan2(half*v - cv, half*u - cu)
+    dtheta = 2 * asin(min(half / rx, 1.0))
+    if large_arc != 0:
+        dtheta = 2*pi - dtheta
+    if sweep == 0:
+        dtheta = -dtheta
+
+    points = [start, end]
+    for i in range(samples + 1):
+        t = theta1 + dtheta * i / float(samples)
+        points.append((cx + rx*cos(t)*c - ry*sin(t)*s,
+                       cy + rx*cos(t)*s + ry*sin(t)*c))
+    return points
+
+
+def _sample_bezier(points, samples):
+    """Sample points along a quadratic or cubic Bézier curve using de
+    Casteljau's algorithm."""
+    result = []
+    for i in range(samples + 1):
+        t = i / float(samples)
+        p = list(points)
+        while len(p) > 1:
+            p = [((1-t)*a[0] + t*b[0], (1-t)*a[1] + t*b[1])
+                 for a, b in zip(p[:-1], p[1:])]
+        result.append(p[0])
+    return result
+
+
+def reference_box(kind, case, samples):
+    """Find the bounding box of a case by dense sampling.
+
+    :return: A tuple ``(box, scale)`` where ``box`` is a tuple (left, right,
+             bottom, top) or None if the segment is not drawn, and ``scale`` is
+             the size of the segment used to set tolerances.
+
+    """
+    if kind == 'arc':
+        points = _sample_arc(*(tuple(case) + (samples,)))
+    else:
+        points = _sample_bezier(case, samples)
+    if not points:
+        return None, 0.0
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    box = (min(xs), max(xs), min(ys), max(ys))
+    scale = max(box[1] - box[0], box[3] - box[2], max(abs(v) for v in box),
+                1e-300)
+
+    # Points on an arc are found from its centre, so their rounding error
+    # depends on the radii even when the arc itself is much smaller.
+    if kind == 'arc':
+        scale = max(scale, abs(case[1]), abs(case[2]))
+    return box, scale
+
+
+def compare(box, reference, scale, samples):
+    """Compare a box with the sampled reference box.
+
+    :return: A tuple ``(ok, under, over)``. ``under`` is the largest distance,
+             relative to the scale, by which the box fails to cover the
+             samples; ``over`` is the largest distance by which it extends
+             past them. Sampling always finds a slightly smaller box than the
+             true one, so ``over`` may be up to the sampling error.
+
+    """
+    box = _as_tuple(box)
+    if reference is None or box is None:
+        return box == reference, 0.0, 0.0
+    under = max(box[0] - reference[0], reference[1] - box[1],
+                box[2] - reference[2], reference[3] - box[3]) / scale
+    over = max(reference[0] - box[0], box[1] - reference[1],
+               reference[2] - box[2], box[3] - reference[3]) / scale
+    ok = under <= 1e-9 and over <= 10.0 / samples**2 + 1e-9
+    return ok, max(under, 0.0), max(over, 0.0)
+
+
+def check_engine(engine, kind, cases, references, samples):
+    """Run an engine over a list of cases and compare it to the reference.
+
+    :return: A dictionary with the time taken, the number of failures, the
+             largest errors and the first failing case.
+
+    """
+    result = {'time': None, 'failures': 0, 'under': 0.0, 'over': 0.0,
+              'example': None}
+
+    # Run the engine on a single case first so that one-off costs such as
+    # importing modules are not timed.
+    try:
+        engine(kind, cases[:1])
+    except Exception:
+        pass
+
+    start = time.time()
+    try:
+        boxes = engine(kind, cases)
+    except Exception:
+        boxes = None
+    result['time'] = time.time() - start
+
+    # If the batch failed, run each case on its own to find the failures.
+    if boxes is None:
+        result['time'] = None
+        boxes = []
+        for case in cases:
+            try:
+                boxes.append(engine(kind, [case])[0])
+            except Exception:
+                boxes.append(sys.exc_info()[1])
+
+    for case, box, (reference, scale) in zip(cases, boxes, references):
+        if isinstance(box, Exception):
+            ok, under, over = False, 0.0, 0.0
+        else:
+            ok, under, over = compare(box, reference, scale, samples)
+        result['under'] = max(result['under'], under)
+        result['over'] = max(result['over'], over)
+        if not ok:
+            result['failures'] += 1
+            if result['example'] is None:
+                result['example'] = (case, box, reference)
+    return result
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('-n', '--count', type='int', default=2000,
+                      help='number of cases of each kind [default: %default]')
+    parser.add_option('-s', '--samples', type='int', default=4096,
+                      help='samples along each segment [default: %default]')
+    parser.add_option('--seed', type='int', default=0,
+                      help='seed for the random corpus [default: %default]')
+    options, args = parser.parse_args(argv)
+
+    rng = random.Random(options.seed)
+    failed = False
+    for kind in KINDS:
+        cases = generate_cases(kind, options.count, rng)
+        start = time.time()
+        references = [reference_box(kind, case, options.samples)
+                      for case in cases]
+        reference_time = time.time() - start
+        print('%s: %d cases, sampled in %.3fs' % (kind, len(cases),
+                                                  reference_time))
+
+        baseline = None
+        for name, engine in ENGINES:
+            result = check_engine(engine, kind, cases, references,
+                                  options.samples)
+            if baseline is None:
+                baseline = result['time']
+            if result['time'] is None:
+                timing = 'batch raised an exception'
+            elif baseline and result['time']:
+                timing = '%.4fs, %.2fx' % (result['time'],
+                                           baseline / result['time'])
+            else:
+                timing = '%.4fs' % result['time']
+            print('  %-12s %5d failures  under %.2e  over %.2e  %s' % (
+                  name, result['failures'], result['under'], result['over'],
+                  timing))
+            if result['failures']:
+                failed = True
+                case, box, reference = result['example']
+                print('    e.g. %r gave %r, expected %r' % (
+                      case, _as_tuple(box) if not isinstance(box, Exception)
+                      else box, reference))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())